@@ -2,6 +2,10 @@ import pandas as pd
 import numpy as np
 import streamlit as st
 import locale
+import io
+import os
+from openpyxl import Workbook
+from esquema import ESQUEMA_CONEXAO, ESQUEMA_PEDIDOS, FILE_CONEXAO, FILE_PEDIDOS, ErroContrato, ler_contrato
 
 # ==============================
 # CONFIGURAÇÕES INICIAIS
@@ -15,78 +19,44 @@ except locale.Error:
     except locale.Error:
         locale.setlocale(locale.LC_ALL, '')
 
-FILE_CONEXAO = 'dados_conexao_unificada.csv'
-FILE_PEDIDOS = 'dados_pedidos.csv'
 COLUNA_ESTADO = 'ESTADO' 
+TAMANHO_BLOCO_EXPORTACAO = 50_000
 
 # ==============================
 # FUNÇÕES DE SUPORTE
 # ==============================
 
-def limpar_cnpj(cnpj_series):
-
-    cnpj_series = cnpj_series.astype(str).fillna('')
-    cnpj_series = cnpj_series.str.replace(r'\.0$', '', regex=True)
-    return cnpj_series.str.replace(r'\D', '', regex=True)
+def versao_dados():
+    """Identifica a versão dos arquivos de dados pela data de modificação."""
+    return tuple(
+        os.path.getmtime(arquivo) if os.path.exists(arquivo) else 0
+        for arquivo in (FILE_CONEXAO, FILE_PEDIDOS)
+    )
 
 
 @st.cache_data
-def carregar_dados_brutos():
+def carregar_dados_brutos(versao):
     df_empty = pd.DataFrame()
     
     try:
-
-        df_conexao = pd.read_csv(FILE_CONEXAO, sep=';', decimal=',', encoding='utf-8-sig')
-        df_conexao.columns = df_conexao.columns.str.upper()
-
-        df_conexao = df_conexao.rename(columns={
-            'CLIENTE': 'CLIENTE_NOME_FATURADO',
-            'CNPJ_CLIENTE': 'CLIENTE_CNPJ_BASE',
-            'TOTAL_FATURADO': 'VALOR_FATURADO',
-            'VALOR_DEVOLVIDO': 'VALOR_DEVOLVIDO',
-            'FORNECEDOR': 'FORNECEDOR_NOME_FATURADO',
-            'CNPJ_FORNECEDOR': 'FORNECEDOR_CNPJ_FATURADO', 
-            'CODFILIAL': 'CODFILIAL_FATURAMENTO'
-        }, errors='ignore')
-
-
-        df_pedidos = pd.read_csv(FILE_PEDIDOS, sep=';', decimal='.', encoding='utf-8')
-        df_pedidos.columns = df_pedidos.columns.str.upper()
-
-        df_pedidos = df_pedidos.rename(columns={
-            'CLIENTE_NOME': 'CLIENTE_NOME',
-            'CLIENTE_CNPJ': 'CLIENTE_CNPJ_BASE',
-            'TOTAL_VALOR_PEDIDO': 'VALOR_PEDIDO',
-            'TOTAL_PEDIDOS_QTD': 'PEDIDOS_QTD',
-            'FORNECEDOR_NOME': 'FORNECEDOR_NOME_PEDIDO',
-            'FORNECEDOR_CNPJ': 'FORNECEDOR_CNPJ_PEDIDO', 
-            'CODFILIAL': 'CODFILIAL_PEDIDO'
-        }, errors='ignore')
+        # Os arquivos já chegam no esquema canônico (ver esquema.py)
+        df_conexao = ler_contrato(FILE_CONEXAO, ESQUEMA_CONEXAO)
+        df_pedidos = ler_contrato(FILE_PEDIDOS, ESQUEMA_PEDIDOS)
 
     except FileNotFoundError:
         st.error(f"⚠️ Erro: Um ou ambos os arquivos ({FILE_CONEXAO}, {FILE_PEDIDOS}) não foram encontrados.")
         return df_empty, df_empty
+    except ErroContrato as e:
+        st.error(f"⚠️ Erro: {e}")
+        return df_empty, df_empty
 
+    return df_conexao, df_pedidos
 
-    
-
-    df_conexao['CLIENTE_CNPJ_LIMPO'] = limpar_cnpj(df_conexao['CLIENTE_CNPJ_BASE'])
-    df_pedidos['CLIENTE_CNPJ_LIMPO'] = limpar_cnpj(df_pedidos['CLIENTE_CNPJ_BASE'])
-
-    df_conexao['FORNECEDOR_CNPJ_LIMPO'] = limpar_cnpj(
-        df_conexao.get('FORNECEDOR_CNPJ_FATURADO', df_conexao.get('FORNECEDOR_NOME_FATURADO'))
-    )
-    df_pedidos['FORNECEDOR_CNPJ_LIMPO'] = limpar_cnpj(
-        df_pedidos.get('FORNECEDOR_CNPJ_PEDIDO', df_pedidos.get('FORNECEDOR_NOME_PEDIDO'))
-    )
-    
 
-    if 'CODFILIAL_FATURAMENTO' not in df_conexao.columns and 'CODFILIAL' in df_conexao.columns:
-        df_conexao['CODFILIAL_FATURAMENTO'] = df_conexao['CODFILIAL']
-    elif 'CODFILIAL_FATURAMENTO' not in df_conexao.columns:
-        df_conexao['CODFILIAL_FATURAMENTO'] = 'FILIAL_UNICA'
-    
-    return df_conexao, df_pedidos
+def centavos_para_reais(df: pd.DataFrame):
+    colunas_valor = [col for col in df.columns if col.startswith('VALOR_') or col == 'DIFERENCA_FLUXO']
+    df[colunas_valor] = df[colunas_valor].astype(float) / 100
+    return df
 
 
 def calcular_metricas_agregadas(df_conexao: pd.DataFrame, df_pedidos: pd.DataFrame, coluna_estado: str = 'ESTADO'):
@@ -96,6 +66,12 @@ def calcular_metricas_agregadas(df_conexao: pd.DataFrame, df_pedidos: pd.DataFra
     if df_conexao.empty and df_pedidos.empty:
         return df_empty, df_empty, df_empty, df_empty
 
+    # Somas e diferenças em centavos (inteiros); a conversão para reais é feita uma vez, no fim
+    df_conexao = df_conexao.rename(columns={
+        'VALOR_FATURADO_CENTAVOS': 'VALOR_FATURADO',
+        'VALOR_DEVOLVIDO_CENTAVOS': 'VALOR_DEVOLVIDO'
+    })
+    df_pedidos = df_pedidos.rename(columns={'VALOR_PEDIDO_CENTAVOS': 'VALOR_PEDIDO'})
 
     df_conexao_agg_cliente = df_conexao.groupby('CLIENTE_CNPJ_LIMPO').agg({
         'CLIENTE_NOME_FATURADO': 'first',
@@ -155,7 +131,7 @@ def calcular_metricas_agregadas(df_conexao: pd.DataFrame, df_pedidos: pd.DataFra
     df_analise_filial['VALOR_LIQUIDO_FATURADO'] = (
         df_analise_filial['VALOR_FATURADO'] - df_analise_filial['VALOR_DEVOLVIDO']
     )
-    df_analise_filial['VALOR_PEDIDO'] = 0.0
+    df_analise_filial['VALOR_PEDIDO'] = 0
     df_analise_filial['DIFERENCA_FLUXO'] = 0 - df_analise_filial['VALOR_FATURADO']
     
     # --- Análise por Estado ---
@@ -168,12 +144,75 @@ def calcular_metricas_agregadas(df_conexao: pd.DataFrame, df_pedidos: pd.DataFra
         df_analise_estado['VALOR_LIQUIDO_FATURADO'] = (
             df_analise_estado['VALOR_FATURADO'] - df_analise_estado['VALOR_DEVOLVIDO']
         )
-        df_analise_estado['VALOR_PEDIDO'] = 0.0
+        df_analise_estado['VALOR_PEDIDO'] = 0
         df_analise_estado['DIFERENCA_FLUXO'] = 0 - df_analise_estado['VALOR_FATURADO']
     else:
         df_analise_estado = pd.DataFrame(columns=['ESTADO', 'VALOR_FATURADO', 'VALOR_DEVOLVIDO', 'VALOR_LIQUIDO_FATURADO', 'VALOR_PEDIDO', 'DIFERENCA_FLUXO'])
     
-    return df_analise_cliente, df_analise_fornecedor, df_analise_filial, df_analise_estado
+    return (
+        centavos_para_reais(df_analise_cliente),
+        centavos_para_reais(df_analise_fornecedor),
+        centavos_para_reais(df_analise_filial),
+        centavos_para_reais(df_analise_estado)
+    )
+
+
+def escrever_csv_em_blocos(df: pd.DataFrame, buffer: io.BytesIO):
+    """Escreve o CSV em blocos de linhas, sem converter a tabela inteira para texto de uma vez."""
+    for inicio in range(0, max(len(df), 1), TAMANHO_BLOCO_EXPORTACAO):
+        bloco = df.iloc[inicio:inicio + TAMANHO_BLOCO_EXPORTACAO]
+        texto = bloco.to_csv(index=False, header=(inicio == 0), sep=';', decimal=',')
+        # BOM apenas no primeiro bloco, para o Excel reconhecer o UTF-8
+        buffer.write(texto.encode('utf-8-sig' if inicio == 0 else 'utf-8'))
+
+
+def escrever_xlsx(df: pd.DataFrame, buffer: io.BytesIO, nome_aba: str):
+    """Escreve o XLSX no modo write-only do openpyxl, linha a linha."""
+    workbook = Workbook(write_only=True)
+    planilha = workbook.create_sheet(title=nome_aba[:31])
+    planilha.append(list(df.columns))
+    for linha in df.itertuples(index=False, name=None):
+        planilha.append([None if pd.isna(valor) else valor for valor in linha])
+    workbook.save(buffer)
+
+
+@st.cache_data(show_spinner=False, max_entries=200)
+def gerar_exportacao(_df: pd.DataFrame, nome_relatorio: str, chave_filtro: str, versao: tuple, formato: str):
+    """Gera o arquivo de exportação, em cache por relatório, filtro, versão dos dados e formato."""
+    buffer = io.BytesIO()
+    if formato == 'XLSX':
+        escrever_xlsx(_df, buffer, nome_relatorio)
+    else:
+        escrever_csv_em_blocos(_df, buffer)
+    return buffer.getvalue()
+
+
+@st.fragment
+def botoes_exportacao(df: pd.DataFrame, nome_relatorio: str, chave_filtro: str, versao: tuple):
+    # Fragmento: trocar o formato ou baixar o arquivo não reexecuta o dashboard inteiro.
+    # O arquivo só é gerado quando o usuário clica, em outra thread (data como callable).
+    col_formato, col_download = st.columns([1, 3])
+    with col_formato:
+        formato = st.radio(
+            'Formato', ['CSV', 'XLSX'], horizontal=True,
+            key=f'formato_{nome_relatorio}', label_visibility='collapsed'
+        )
+
+    def arquivo():
+        return gerar_exportacao(df, nome_relatorio, chave_filtro, versao, formato)
+
+    mime = (
+        'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        if formato == 'XLSX' else 'text/csv'
+    )
+    with col_download:
+        st.download_button(
+            f'⬇️ Exportar {formato}',
+            data=arquivo,
+            file_name=f"{nome_relatorio}_{chave_filtro}.{formato.lower()}",
+            mime=mime,
+            key=f'download_{nome_relatorio}'
+        )
 
 
 def formatar_moeda(valor):
@@ -197,10 +236,11 @@ def main():
         st.markdown("## Análise de Resultados do Evento Conexão")
 
 
-    df_conexao_bruto, df_pedidos_bruto = carregar_dados_brutos()
+    versao = versao_dados()
+    df_conexao_bruto, df_pedidos_bruto = carregar_dados_brutos(versao)
 
     if df_conexao_bruto.empty:
-        st.warning("Não há dados suficientes para análise. Verifique os arquivos CSV.")
+        st.warning("Não há dados suficientes para análise. Verifique os arquivos de dados.")
         return
 
 
@@ -335,6 +375,10 @@ def main():
         for col in cols_to_display_filial[1:]:
             df_display_filial[col] = df_display_filial[col].apply(formatar_moeda)
         st.dataframe(df_display_filial[cols_to_display_filial], use_container_width=True, hide_index=True)
+        display_cols_filial = dict(zip(cols_to_display_filial, ['Filial', 'Valor Faturado', 'Valor Devolvido', 'Receita Líquida']))
+        df_export_filial = df_analise_filial.sort_values(by='VALOR_LIQUIDO_FATURADO', ascending=False)[cols_to_display_filial] \
+            .rename(columns=display_cols_filial)
+        botoes_exportacao(df_export_filial, 'analise_filial', estado_selecionado, versao)
     else:
         st.info("Nenhuma filial encontrada para análise.")
 
@@ -350,6 +394,10 @@ def main():
         for col in cols_to_display_estado[1:]:
             df_display_estado[col] = df_display_estado[col].apply(formatar_moeda)
         st.dataframe(df_display_estado[cols_to_display_estado], use_container_width=True, hide_index=True)
+        display_cols_estado = dict(zip(cols_to_display_estado, ['Estado', 'Valor Faturado', 'Valor Devolvido', 'Receita Líquida']))
+        df_export_estado = df_analise_estado.sort_values(by='VALOR_LIQUIDO_FATURADO', ascending=False)[cols_to_display_estado] \
+            .rename(columns=display_cols_estado)
+        botoes_exportacao(df_export_estado, 'analise_estado', estado_selecionado, versao)
     else:
         st.info('Nenhuma Estado encontrado para análise.')
 
@@ -368,6 +416,8 @@ def main():
         display_cols = dict(zip(cols, ['Cliente', 'CNPJ', 'Valor Pedido', 'Valor Faturado', 'Valor Devolvido', 'Diferença Fluxo', 'Receita Líquida']))
         df_display_cliente_final = df_display_cliente[cols].rename(columns=display_cols)
         st.dataframe(df_display_cliente_final, use_container_width=True)
+        df_export_cliente = df_analise_cliente.sort_values(by='DIFERENCA_FLUXO', ascending=False)[cols].rename(columns=display_cols)
+        botoes_exportacao(df_export_cliente, 'analise_cliente', estado_selecionado, versao)
     else:
         st.info("Nenhum cliente encontrado.")
 
@@ -385,6 +435,8 @@ def main():
         display_cols_forn = dict(zip(cols, ['Fornecedor', 'CNPJ', 'Valor Pedido', 'Valor Faturado', 'Valor Devolvido', 'Diferença Fluxo']))
         df_display_fornecedor_final = df_display_fornecedor[cols].rename(columns=display_cols_forn)
         st.dataframe(df_display_fornecedor_final, use_container_width=True)
+        df_export_fornecedor = df_analise_fornecedor.sort_values(by='DIFERENCA_FLUXO', ascending=False)[cols].rename(columns=display_cols_forn)
+        botoes_exportacao(df_export_fornecedor, 'analise_fornecedor', estado_selecionado, versao)
     else:
         st.info("Nenhum fornecedor encontrado.")
 
@@ -0,0 +1,131 @@
+"""
+Contrato de dados entre os extratores (oracle.py, pgadmin2.py) e o dashboard (analise.py).
+
+Os extratores normalizam os dados uma única vez e gravam Parquet com o esquema
+canônico abaixo: chaves inteiras, valores em centavos e nomes de colunas unificados.
+O esquema vai embutido no arquivo, e qualquer divergência é barrada na gravação.
+
+Executar este arquivo converte os CSVs antigos para o novo formato:
+    python esquema.py
+"""
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+VERSAO_CONTRATO = '1'
+
+FILE_CONEXAO = 'dados_conexao.parquet'
+FILE_PEDIDOS = 'dados_pedidos.parquet'
+
+ESQUEMA_CONEXAO = pa.schema([
+    pa.field('CODFILIAL_FATURAMENTO', pa.int32(), nullable=False),
+    pa.field('NUMPED', pa.int64(), nullable=False),
+    pa.field('FORNECEDOR_CNPJ_LIMPO', pa.int64(), nullable=False),
+    pa.field('FORNECEDOR_NOME_FATURADO', pa.string()),
+    pa.field('CLIENTE_CNPJ_LIMPO', pa.int64(), nullable=False),
+    pa.field('CLIENTE_NOME_FATURADO', pa.string()),
+    pa.field('ESTADO', pa.string()),
+    pa.field('VALOR_FATURADO_CENTAVOS', pa.int64(), nullable=False),
+    pa.field('VALOR_DEVOLVIDO_CENTAVOS', pa.int64(), nullable=False),
+], metadata={'contrato': 'conexao', 'versao': VERSAO_CONTRATO})
+
+ESQUEMA_PEDIDOS = pa.schema([
+    pa.field('FORNECEDOR_CNPJ_LIMPO', pa.int64(), nullable=False),
+    pa.field('FORNECEDOR_NOME_PEDIDO', pa.string()),
+    pa.field('CLIENTE_CNPJ_LIMPO', pa.int64(), nullable=False),
+    pa.field('CLIENTE_NOME', pa.string()),
+    pa.field('ESTADO', pa.string()),
+    pa.field('VALOR_PEDIDO_CENTAVOS', pa.int64(), nullable=False),
+    pa.field('PEDIDOS_QTD', pa.int64(), nullable=False),
+], metadata={'contrato': 'pedidos', 'versao': VERSAO_CONTRATO})
+
+
+class ErroContrato(ValueError):
+    """Os dados não respeitam o esquema canônico."""
+
+
+# ==============================
+# NORMALIZAÇÃO
+# ==============================
+
+def para_chave(serie):
+    # Chave ausente (ex.: pedido sem fornecedor no LEFT JOIN) vira 0, que não é código válido no ERP
+    return pd.to_numeric(serie).fillna(0).astype('int64')
+
+
+def para_centavos(serie):
+    return (pd.to_numeric(serie.astype(float)).fillna(0) * 100).round().astype('int64')
+
+
+def normalizar_conexao(df):
+    """Converte o resultado das consultas Oracle para o esquema canônico de conexão."""
+    df = df.rename(columns=str.upper)
+    return pd.DataFrame({
+        'CODFILIAL_FATURAMENTO': para_chave(df['CODFILIAL']).astype('int32'),
+        'NUMPED': para_chave(df['NUMPED']),
+        'FORNECEDOR_CNPJ_LIMPO': para_chave(df['CNPJ_FORNECEDOR']),
+        'FORNECEDOR_NOME_FATURADO': df['FORNECEDOR'],
+        'CLIENTE_CNPJ_LIMPO': para_chave(df['CNPJ_CLIENTE']),
+        'CLIENTE_NOME_FATURADO': df['CLIENTE'],
+        'ESTADO': df['ESTADO'],
+        'VALOR_FATURADO_CENTAVOS': para_centavos(df['TOTAL_FATURADO']),
+        'VALOR_DEVOLVIDO_CENTAVOS': para_centavos(df['VALOR_DEVOLVIDO']),
+    })
+
+
+def normalizar_pedidos(df):
+    """Converte o resultado da consulta PostgreSQL para o esquema canônico de pedidos."""
+    df = df.rename(columns=str.upper)
+    return pd.DataFrame({
+        'FORNECEDOR_CNPJ_LIMPO': para_chave(df['FORNECEDOR_CNPJ']),
+        'FORNECEDOR_NOME_PEDIDO': df['FORNECEDOR_NOME'],
+        'CLIENTE_CNPJ_LIMPO': para_chave(df['CLIENTE_CNPJ']),
+        'CLIENTE_NOME': df['CLIENTE_NOME'],
+        'ESTADO': df['ESTADO'],
+        'VALOR_PEDIDO_CENTAVOS': para_centavos(df['TOTAL_VALOR_PEDIDO']),
+        'PEDIDOS_QTD': para_chave(df['TOTAL_PEDIDOS_QTD']),
+    })
+
+
+# ==============================
+# GRAVAÇÃO E LEITURA
+# ==============================
+
+def gravar_contrato(df, caminho, esquema):
+    """Valida o DataFrame contra o esquema e grava o Parquet com o esquema embutido."""
+    if list(df.columns) != esquema.names:
+        raise ErroContrato(f"Colunas divergentes para '{caminho}': esperado {esquema.names}, recebido {list(df.columns)}.")
+
+    try:
+        tabela = pa.Table.from_pandas(df, schema=esquema, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+        raise ErroContrato(f"Tipos divergentes para '{caminho}': {e}") from e
+
+    for campo in esquema:
+        if not campo.nullable and tabela.column(campo.name).null_count > 0:
+            raise ErroContrato(f"Coluna '{campo.name}' não aceita valores nulos em '{caminho}'.")
+
+    pq.write_table(tabela, caminho)
+
+
+def ler_contrato(caminho, esquema):
+    """Lê um Parquet do contrato, recusando arquivos gravados com outro esquema."""
+    tabela = pq.read_table(caminho)
+    metadados = tabela.schema.metadata or {}
+    if (
+        not tabela.schema.equals(esquema, check_metadata=False)
+        or metadados.get(b'contrato') != esquema.metadata[b'contrato']
+        or metadados.get(b'versao') != esquema.metadata[b'versao']
+    ):
+        raise ErroContrato(f"O arquivo '{caminho}' não segue o contrato de dados v{VERSAO_CONTRATO}. Refaça a extração.")
+    return tabela.to_pandas()
+
+
+if __name__ == "__main__":
+    df_conexao = pd.read_csv('dados_conexao_unificada.csv', sep=';', decimal=',', encoding='utf-8-sig')
+    gravar_contrato(normalizar_conexao(df_conexao), FILE_CONEXAO, ESQUEMA_CONEXAO)
+    print(f"✅ {len(df_conexao)} linhas convertidas para '{FILE_CONEXAO}'.")
+
+    df_pedidos = pd.read_csv('dados_pedidos.csv', sep=';', decimal='.', encoding='utf-8')
+    gravar_contrato(normalizar_pedidos(df_pedidos), FILE_PEDIDOS, ESQUEMA_PEDIDOS)
+    print(f"✅ {len(df_pedidos)} linhas convertidas para '{FILE_PEDIDOS}'.")
@@ -2,6 +2,10 @@ import pandas as pd
 import oracledb
 from dotenv import load_dotenv
 import os
+import argparse
+import hashlib
+from datetime import date, datetime, timedelta
+from esquema import ESQUEMA_CONEXAO, FILE_CONEXAO, ErroContrato, gravar_contrato, normalizar_conexao
 
 try:
     oracledb.init_oracle_client(lib_dir=r"C:\instantclient_23_9")
@@ -14,9 +18,15 @@ ORACLE_USER = os.getenv("ORACLE_USER")
 ORACLE_PASSWORD = os.getenv("ORACLE_PASSWORD")
 dsn = '192.168.0.1/WINT'
 
+DIRETORIO_CACHE = 'cache_oracle'
+# Pedidos ainda podem ser faturados ou receber devoluções depois da data do pedido;
+# só dias mais antigos que isso são considerados estáveis e entram no cache
+DIAS_ESTAVEIS_PADRAO = 60
+
 # --- Consultas SQL  ---
 
 # valor dos pedidos por cliente (ol)
+# Parametrizada por período (data_fim exclusiva), emitente e tipos de pedido (binds_tipofv)
 sql_conexao_clientes_ol = """
     WITH fornecedor_pedido AS (
         SELECT
@@ -29,6 +39,7 @@ sql_conexao_clientes_ol = """
         GROUP BY m.numped, m.codfornec, f.fornecedor
     )
     SELECT
+        TRUNC(p.data) AS data_pedido,
         p.codfilial,
         p.numped,
         fp.cgc_fornecedor AS cnpj_fornecedor,
@@ -49,11 +60,11 @@ sql_conexao_clientes_ol = """
         WHERE m.codoper = 'ED' AND m.numped <> 0 AND m.codfornec <> 0
         GROUP BY m.numped
     ) d ON d.numped = p.numped
-    WHERE p.data BETWEEN TO_DATE('12/04/2025', 'DD/MM/YYYY') AND TO_DATE('21/04/2025', 'DD/MM/YYYY')
+    WHERE p.data >= :data_inicio AND p.data < :data_fim
     AND p.posicao IN ('F')
-    AND p.tipofv IN ( 'OL')
+    AND p.tipofv IN ({binds_tipofv})
     AND p.origemped IN ('F')
-    AND p.codemitente IN (8888)
+    AND p.codemitente = :codemitente
     ORDER BY p.numped
 """
 # valor dos pedidos por cliente (pela condição da promoção)
@@ -135,39 +146,156 @@ sql_conexao_clientes_condicao = """
 """
 
 
+# --- Cache local por dia ---
 
-try:
-    with oracledb.connect(user=ORACLE_USER, password=ORACLE_PASSWORD, dsn=dsn) as connection:
-        print("Conexão com o banco de dados Oracle estabelecida com sucesso.")
+def chave_consulta_ol(codemitente, tipos_fv):
+    """Hash da consulta OL e dos parâmetros que não são de data (identifica a pasta do cache)."""
+    conteudo = f"{sql_conexao_clientes_ol}|{codemitente}|{','.join(sorted(tipos_fv))}"
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()[:16]
 
 
-        print("Executando consulta de pedidos 'OL'...")
-        df_ol = pd.read_sql(sql_conexao_clientes_ol, con=connection)
-        print(f"{len(df_ol)} linhas retornadas para 'OL'.")
+def caminho_particao(chave, dia):
+    return os.path.join(DIRETORIO_CACHE, chave, f"{dia.isoformat()}.pkl")
 
 
-        print("Executando consulta de pedidos por 'CONDIÇÃO'...")
-        df_condicao = pd.read_sql(sql_conexao_clientes_condicao, con=connection)
-        print(f"{len(df_condicao)} linhas retornadas para 'CONDIÇÃO'.")
+def agrupar_dias_consecutivos(dias):
+    """Agrupa dias ordenados em intervalos contínuos [(inicio, fim), ...]."""
+    intervalos = []
+    for dia in dias:
+        if intervalos and dia == intervalos[-1][1] + timedelta(days=1):
+            intervalos[-1] = (intervalos[-1][0], dia)
+        else:
+            intervalos.append((dia, dia))
+    return intervalos
 
 
-        df_completo = pd.concat([df_ol, df_condicao], ignore_index=True)
-        print(f"Total de linhas após concatenação: {len(df_completo)}")
+def consultar_ol(connection, inicio, fim, codemitente, tipos_fv):
+    binds_tipofv = ', '.join(f":tipofv_{i}" for i in range(len(tipos_fv)))
+    params = {
+        'data_inicio': datetime.combine(inicio, datetime.min.time()),
+        'data_fim': datetime.combine(fim + timedelta(days=1), datetime.min.time()),
+        'codemitente': codemitente,
+    }
+    params.update({f"tipofv_{i}": tipo for i, tipo in enumerate(tipos_fv)})
+    sql = sql_conexao_clientes_ol.format(binds_tipofv=binds_tipofv)
+    return pd.read_sql(sql, con=connection, params=params)
 
-        colunas_chave = ['CODFILIAL', 'NUMPED', 'CNPJ_CLIENTE', 'CNPJ_FORNECEDOR']
-        df_final = df_completo.drop_duplicates(subset=colunas_chave, keep='first')
 
-        print(f"Total de pedidos únicos após remover duplicatas: {len(df_final)}")
+def gravar_particao(df_dia, caminho):
+    # Grava em arquivo temporário e renomeia, para que uma execução interrompida
+    # nunca deixe uma partição truncada que pareça estar em cache
+    caminho_temporario = f"{caminho}.tmp"
+    df_dia.to_pickle(caminho_temporario)
+    os.replace(caminho_temporario, caminho)
 
-        df_final.to_csv('dados_conexao_unificada.csv', index=False, sep=';', encoding='utf-8-sig', decimal=',')
 
-        print("\n✅ Dados UNIFICADOS e exportados com sucesso para 'dados_conexao_unificada.csv' 🎉")
+def buscar_pedidos_ol(connection, data_inicio, data_fim, codemitente, tipos_fv,
+                      dias_estaveis=DIAS_ESTAVEIS_PADRAO, atualizar=False):
+    """Retorna os pedidos OL do período, consultando no banco apenas os dias ausentes do cache.
 
+    Só são gravados no cache os dias com mais de `dias_estaveis` dias; com `atualizar`,
+    o cache é ignorado e todo o período é consultado novamente.
+    """
+    chave = chave_consulta_ol(codemitente, tipos_fv)
+    os.makedirs(os.path.join(DIRETORIO_CACHE, chave), exist_ok=True)
+    limite_estavel = date.today() - timedelta(days=dias_estaveis)
 
-except oracledb.Error as e:
-    error_obj = e.args[0]
-    print(f'\n❌ Erro ao se conectar ou executar a query no banco Oracle: {error_obj.code}: {error_obj.message}')
-    print("Verifique as credenciais, a DSN e o status do servidor.")
+    dias = [data_inicio + timedelta(days=n) for n in range((data_fim - data_inicio).days + 1)]
+    if atualizar:
+        dias_faltantes = dias
+    else:
+        dias_faltantes = [dia for dia in dias if not os.path.exists(caminho_particao(chave, dia))]
+    print(f"Período com {len(dias)} dia(s): {len(dias) - len(dias_faltantes)} em cache, {len(dias_faltantes)} a consultar.")
 
-except Exception as e:
-    print(f'\n⚠️ Ocorreu um erro inesperado: {e}')
\ No newline at end of file
+    particoes = []
+    for inicio, fim in agrupar_dias_consecutivos(dias_faltantes):
+        print(f"Consultando pedidos 'OL' de {inicio:%d/%m/%Y} a {fim:%d/%m/%Y}...")
+        df_intervalo = consultar_ol(connection, inicio, fim, codemitente, tipos_fv)
+        df_intervalo['DATA_PEDIDO'] = pd.to_datetime(df_intervalo['DATA_PEDIDO']).dt.date
+
+        for dia in dias_faltantes:
+            if not inicio <= dia <= fim:
+                continue
+            df_dia = df_intervalo[df_intervalo['DATA_PEDIDO'] == dia]
+            if dia < limite_estavel:
+                gravar_particao(df_dia, caminho_particao(chave, dia))
+            particoes.append(df_dia)
+
+    for dia in dias:
+        if dia not in dias_faltantes:
+            particoes.append(pd.read_pickle(caminho_particao(chave, dia)))
+
+    df_ol = pd.concat(particoes, ignore_index=True).sort_values('NUMPED', ignore_index=True)
+    return df_ol.drop(columns=['DATA_PEDIDO'])
+
+
+def ler_argumentos():
+    parser = argparse.ArgumentParser(description="Extração dos pedidos do evento Conexão no Oracle.")
+    parser.add_argument('--data-inicio', default='12/04/2025', help="Data inicial (DD/MM/AAAA).")
+    parser.add_argument('--data-fim', default='21/04/2025', help="Data final, inclusiva (DD/MM/AAAA).")
+    parser.add_argument('--codemitente', type=int, default=8888, help="Código do emitente dos pedidos.")
+    parser.add_argument('--tipofv', nargs='+', default=['OL'], help="Tipos de pedido (p.tipofv).")
+    parser.add_argument(
+        '--dias-estaveis', type=int, default=DIAS_ESTAVEIS_PADRAO,
+        help=f"Idade mínima, em dias, para um dia entrar no cache (padrão: {DIAS_ESTAVEIS_PADRAO})."
+    )
+    parser.add_argument(
+        '--atualizar', '--sem-cache', action='store_true',
+        help="Ignora o cache e consulta todo o período novamente, regravando as partições estáveis."
+    )
+    args = parser.parse_args()
+    args.data_inicio = datetime.strptime(args.data_inicio, '%d/%m/%Y').date()
+    args.data_fim = datetime.strptime(args.data_fim, '%d/%m/%Y').date()
+    if args.data_fim < args.data_inicio:
+        parser.error("--data-fim deve ser igual ou posterior a --data-inicio.")
+    if args.dias_estaveis < 0:
+        parser.error("--dias-estaveis não pode ser negativo.")
+    return args
+
+
+def main():
+    args = ler_argumentos()
+    try:
+        with oracledb.connect(user=ORACLE_USER, password=ORACLE_PASSWORD, dsn=dsn) as connection:
+            print("Conexão com o banco de dados Oracle estabelecida com sucesso.")
+
+
+            df_ol = buscar_pedidos_ol(
+                connection, args.data_inicio, args.data_fim, args.codemitente, args.tipofv,
+                dias_estaveis=args.dias_estaveis, atualizar=args.atualizar
+            )
+            print(f"{len(df_ol)} linhas retornadas para 'OL'.")
+
+
+            print("Executando consulta de pedidos por 'CONDIÇÃO'...")
+            df_condicao = pd.read_sql(sql_conexao_clientes_condicao, con=connection)
+            print(f"{len(df_condicao)} linhas retornadas para 'CONDIÇÃO'.")
+
+
+            df_completo = pd.concat([df_ol, df_condicao], ignore_index=True)
+            print(f"Total de linhas após concatenação: {len(df_completo)}")
+
+            colunas_chave = ['CODFILIAL', 'NUMPED', 'CNPJ_CLIENTE', 'CNPJ_FORNECEDOR']
+            df_final = df_completo.drop_duplicates(subset=colunas_chave, keep='first')
+
+            print(f"Total de pedidos únicos após remover duplicatas: {len(df_final)}")
+
+            gravar_contrato(normalizar_conexao(df_final), FILE_CONEXAO, ESQUEMA_CONEXAO)
+
+            print(f"\n✅ Dados UNIFICADOS e exportados com sucesso para '{FILE_CONEXAO}' 🎉")
+
+
+    except oracledb.Error as e:
+        error_obj = e.args[0]
+        print(f'\n❌ Erro ao se conectar ou executar a query no banco Oracle: {error_obj.code}: {error_obj.message}')
+        print("Verifique as credenciais, a DSN e o status do servidor.")
+
+    except ErroContrato as e:
+        print(f'\n❌ Os dados extraídos não respeitam o contrato de dados: {e}')
+
+    except Exception as e:
+        print(f'\n⚠️ Ocorreu um erro inesperado: {e}')
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,8 @@
 import psycopg2
-import csv
+import pandas as pd
 from dotenv import load_dotenv
 import os 
+from esquema import ESQUEMA_PEDIDOS, FILE_PEDIDOS, gravar_contrato, normalizar_pedidos
 # Corrigido: As importações de dotenv e os agora estão separadas corretamente
 
 # 1. CARREGA AS VARIÁVEIS DE AMBIENTE (do arquivo .env)
@@ -33,7 +34,7 @@ sql_d_conexao = """
         c.estado
 """
 
-csv_pedidos_compra = 'dados_pedidos.csv'
+arquivo_pedidos_compra = FILE_PEDIDOS
 
 # 3. LEITURA E CONFIGURAÇÃO DA CONEXÃO DO POSTGRES
 # Estas variáveis foram lidas após o load_dotenv() e antes da conexão
@@ -52,8 +53,8 @@ DB_CONFIG = {
 
 conn = None
 
-def exportar_para_csv(cursor, sql_query, csv_filename):
-    """Executa uma consulta SQL e salva os resultados em um arquivo CSV."""
+def exportar_para_parquet(cursor, sql_query, arquivo_destino):
+    """Executa uma consulta SQL e salva os resultados no Parquet do contrato de dados."""
     try:
         # 1. Executa a consulta
         cursor.execute(sql_query)
@@ -61,30 +62,21 @@ def exportar_para_csv(cursor, sql_query, csv_filename):
         
         # Se não houver registros, imprime uma mensagem e retorna
         if not records and cursor.description is None:
-            print(f"Aviso: A consulta para '{csv_filename}' não retornou resultados ou estrutura.")
+            print(f"Aviso: A consulta para '{arquivo_destino}' não retornou resultados ou estrutura.")
             return
 
         # 2. Pega os nomes das colunas
-        # Usamos o MAX para evitar um erro caso o cursor não tenha descrição
         column_names = [desc[0] for desc in cursor.description]
 
-        # 3. Escreve no arquivo CSV
-        print(f"Escrevendo {len(records)} registro(s) no arquivo '{csv_filename}'...")
-        # Usa 'w' para sobrescrever, 'newline='' para evitar linhas em branco no Windows
-        with open(csv_filename, 'w', newline='', encoding='utf-8') as csvfile:
-            # Usa ';' como delimitador
-            csv_writer = csv.writer(csvfile, delimiter=';') 
-            
-            # Escreve o cabeçalho
-            csv_writer.writerow(column_names)
-            
-            # Escreve os dados
-            csv_writer.writerows(records)
-
-        print(f"Sucesso! Dados exportados para '{csv_filename}'.")
+        # 3. Normaliza para o esquema canônico e grava (divergências de esquema falham aqui)
+        print(f"Escrevendo {len(records)} registro(s) no arquivo '{arquivo_destino}'...")
+        df_pedidos = pd.DataFrame.from_records(records, columns=column_names)
+        gravar_contrato(normalizar_pedidos(df_pedidos), arquivo_destino, ESQUEMA_PEDIDOS)
+
+        print(f"Sucesso! Dados exportados para '{arquivo_destino}'.")
 
     except Exception as e:
-        print(f"Ocorreu um erro ao exportar para '{csv_filename}': {e}")
+        print(f"Ocorreu um erro ao exportar para '{arquivo_destino}': {e}")
         # Re-lança o erro para ser capturado no bloco principal, se necessário
         raise
 
@@ -96,7 +88,7 @@ try:
     print("-" * 30)
     
     # 2. Exporta os resultados das consultas
-    exportar_para_csv(cursor, sql_d_conexao, csv_pedidos_compra)
+    exportar_para_parquet(cursor, sql_d_conexao, arquivo_pedidos_compra)
     print("-" * 30)
 
 
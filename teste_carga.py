@@ -0,0 +1,230 @@
+"""
+Teste de carga do dashboard (analise.py).
+
+Simula N sessões simultâneas usando o AppTest do Streamlit. Cada sessão troca o
+filtro de UF da barra lateral e o seletor de estado da seção 7, e o script mede a
+latência de cada rerun (p50/p95/p99), a vazão total e o RSS do processo.
+
+Como o AppTest executa o app no mesmo processo (com o mesmo st.cache_data
+compartilhado entre as sessões), o RSS medido aqui é uma boa aproximação do
+consumo de memória do servidor real.
+
+Uso:
+    python teste_carga.py --sessoes 50 --interacoes 10 --escala 5
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from streamlit.testing.v1 import AppTest
+
+from esquema import ESQUEMA_CONEXAO, ESQUEMA_PEDIDOS, FILE_CONEXAO, FILE_PEDIDOS, gravar_contrato, ler_contrato
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+    import resource
+
+DIRETORIO_BASE = os.path.dirname(os.path.abspath(__file__))
+SCRIPT_APP = os.path.join(DIRETORIO_BASE, 'analise.py')
+
+# Deslocamento aplicado às chaves de cada cópia, acima de qualquer código real
+DESLOCAMENTO_CHAVES = 10 ** 12
+ARQUIVOS_AUXILIARES = ['logo_total.png', 'conexao_2025_clientes fat.xlsx']
+
+ROTULO_FILTRO_UF = 'Selecione o Estado/UF:'
+ROTULO_FILTRO_SECAO_7 = '**Filtrar por Estado:**'
+
+
+# ==============================
+# DADOS SINTÉTICOS
+# ==============================
+
+def gerar_dados_sinteticos(destino, escala):
+    """Replica os dados reais `escala` vezes, criando novos clientes e pedidos a cada cópia."""
+    df_conexao = ler_contrato(os.path.join(DIRETORIO_BASE, FILE_CONEXAO), ESQUEMA_CONEXAO)
+    df_pedidos = ler_contrato(os.path.join(DIRETORIO_BASE, FILE_PEDIDOS), ESQUEMA_PEDIDOS)
+
+    copias_conexao = []
+    copias_pedidos = []
+    for i in range(escala):
+        deslocamento = i * DESLOCAMENTO_CHAVES
+
+        # Fornecedores são mantidos; clientes e pedidos crescem com a escala
+        copia_conexao = df_conexao.copy()
+        copia_conexao['CLIENTE_CNPJ_LIMPO'] += deslocamento
+        copia_conexao['NUMPED'] += deslocamento
+        copias_conexao.append(copia_conexao)
+
+        copia_pedidos = df_pedidos.copy()
+        copia_pedidos['CLIENTE_CNPJ_LIMPO'] += deslocamento
+        copias_pedidos.append(copia_pedidos)
+
+    gravar_contrato(pd.concat(copias_conexao, ignore_index=True), os.path.join(destino, FILE_CONEXAO), ESQUEMA_CONEXAO)
+    gravar_contrato(pd.concat(copias_pedidos, ignore_index=True), os.path.join(destino, FILE_PEDIDOS), ESQUEMA_PEDIDOS)
+
+    for arquivo in ARQUIVOS_AUXILIARES:
+        origem = os.path.join(DIRETORIO_BASE, arquivo)
+        if os.path.exists(origem):
+            shutil.copy(origem, destino)
+
+    return len(df_conexao) * escala, len(df_pedidos) * escala
+
+
+# ==============================
+# MEDIÇÃO DE MEMÓRIA
+# ==============================
+
+def rss_atual_mb():
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 1024 ** 2
+    # Sem psutil, o melhor disponível é o pico (ru_maxrss, em KB no Linux)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class MonitorMemoria(threading.Thread):
+    """Amostra o RSS do processo periodicamente enquanto o teste roda."""
+
+    def __init__(self, intervalo=0.2):
+        super().__init__(daemon=True)
+        self.intervalo = intervalo
+        self.amostras = []
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.is_set():
+            self.amostras.append(rss_atual_mb())
+            self._parar.wait(self.intervalo)
+
+    def parar(self):
+        self._parar.set()
+        self.join()
+        self.amostras.append(rss_atual_mb())
+
+
+# ==============================
+# SIMULAÇÃO DE SESSÕES
+# ==============================
+
+def selectbox_por_rotulo(at, rotulo):
+    for selectbox in at.selectbox:
+        if selectbox.label == rotulo:
+            return selectbox
+    return None
+
+
+def executar_rerun(at, tipo, resultados):
+    """Executa um rerun e registra sua latência; retorna False se a sessão deve parar."""
+    inicio = time.perf_counter()
+    try:
+        at.run()
+    except RuntimeError:
+        # Rerun acima do --timeout: conta como erro em vez de abortar o teste inteiro
+        resultados.append((tipo, time.perf_counter() - inicio, True))
+        return False
+    duracao = time.perf_counter() - inicio
+    resultados.append((tipo, duracao, len(at.exception) > 0))
+    return True
+
+
+def simular_sessao(id_sessao, interacoes, timeout, semente):
+    """Abre uma sessão e alterna os dois filtros do dashboard, registrando cada rerun."""
+    aleatorio = random.Random(semente + id_sessao)
+    resultados = []
+
+    at = AppTest.from_file(SCRIPT_APP, default_timeout=timeout)
+    if not executar_rerun(at, 'carga_inicial', resultados):
+        return resultados
+
+    for _ in range(interacoes):
+        for rotulo, tipo in ((ROTULO_FILTRO_UF, 'filtro_uf'), (ROTULO_FILTRO_SECAO_7, 'filtro_secao_7')):
+            selectbox = selectbox_por_rotulo(at, rotulo)
+            if selectbox is None or not selectbox.options:
+                continue
+            selectbox.set_value(aleatorio.choice(selectbox.options))
+            if not executar_rerun(at, tipo, resultados):
+                return resultados
+
+    return resultados
+
+
+def percentil(valores, p):
+    if len(valores) == 1:
+        return valores[0]
+    return statistics.quantiles(valores, n=100, method='inclusive')[p - 1]
+
+
+def imprimir_relatorio(resultados, duracao_total, amostras_rss, rss_inicial):
+    print("\n" + "=" * 60)
+    print("RESULTADO DO TESTE DE CARGA")
+    print("=" * 60)
+
+    print(f"{'Tipo':<16}{'Reruns':>8}{'Erros':>7}{'p50 (ms)':>10}{'p95 (ms)':>10}{'p99 (ms)':>10}")
+    tipos = ['carga_inicial', 'filtro_uf', 'filtro_secao_7', 'total']
+    for tipo in tipos:
+        selecionados = [r for r in resultados if tipo == 'total' or r[0] == tipo]
+        if not selecionados:
+            continue
+        latencias = sorted(r[1] * 1000 for r in selecionados)
+        erros = sum(1 for r in selecionados if r[2])
+        print(
+            f"{tipo:<16}{len(selecionados):>8}{erros:>7}"
+            f"{percentil(latencias, 50):>10.0f}{percentil(latencias, 95):>10.0f}{percentil(latencias, 99):>10.0f}"
+        )
+
+    print("-" * 60)
+    print(f"Duração total: {duracao_total:.1f} s")
+    print(f"Vazão: {len(resultados) / duracao_total:.1f} reruns/s")
+    print(f"RSS inicial: {rss_inicial:.0f} MB | pico: {max(amostras_rss):.0f} MB | final: {amostras_rss[-1]:.0f} MB")
+    if psutil is None:
+        print("Aviso: psutil não instalado; os valores de RSS são o pico (ru_maxrss) do processo.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga do dashboard analise.py com sessões simultâneas.")
+    parser.add_argument('--sessoes', type=int, default=50, help="Número de sessões simultâneas (padrão: 50).")
+    parser.add_argument('--interacoes', type=int, default=10, help="Trocas de filtro por sessão (padrão: 10).")
+    parser.add_argument('--escala', type=int, default=1, help="Multiplicador do tamanho dos dados (padrão: 1).")
+    parser.add_argument('--timeout', type=float, default=60, help="Tempo máximo de cada rerun, em segundos.")
+    parser.add_argument('--semente', type=int, default=42, help="Semente para a escolha dos filtros.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='teste_carga_') as diretorio_dados:
+        linhas_conexao, linhas_pedidos = gerar_dados_sinteticos(diretorio_dados, args.escala)
+        print(f"Dados sintéticos (escala {args.escala}x): {linhas_conexao} linhas de conexão, {linhas_pedidos} de pedidos.")
+
+        # O app lê os arquivos pelo caminho relativo, então roda a partir da pasta sintética
+        diretorio_original = os.getcwd()
+        os.chdir(diretorio_dados)
+        try:
+            rss_inicial = rss_atual_mb()
+            monitor = MonitorMemoria()
+            monitor.start()
+
+            print(f"Iniciando {args.sessoes} sessões com {args.interacoes} interações cada...")
+            inicio = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.sessoes) as executor:
+                futuros = [
+                    executor.submit(simular_sessao, i, args.interacoes, args.timeout, args.semente)
+                    for i in range(args.sessoes)
+                ]
+                resultados = [r for futuro in futuros for r in futuro.result()]
+            duracao_total = time.perf_counter() - inicio
+
+            monitor.parar()
+        finally:
+            os.chdir(diretorio_original)
+
+    imprimir_relatorio(resultados, duracao_total, monitor.amostras, rss_inicial)
+
+
+if __name__ == "__main__":
+    main()